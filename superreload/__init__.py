@@ -1,38 +1,68 @@
 
+import contextlib
 import gc
 import importlib
-import inspect
 import logging
 import sys
 import traceback
+from collections import deque
 from types import BuiltinFunctionType, FunctionType, ModuleType
-from typing import Callable, Iterator, Union, Optional, Type, List, Tuple
+from typing import Callable, Iterable, Iterator, Union, Optional, Type, List, Tuple
 
 logger = logging.getLogger(__name__)
 
 ClassOrFunction = Union[Type, FunctionType]
 
-# 
-# method for getting subclasses for py2 objects that don't
-# inherit object, left here for reference.
-# 
-def _find_subclasses_slow_py2(class_type: (Type)) -> List[Type]:
-    subclasses = []
-    for other_mod in sys.modules.values():
-        for name, obj in inspect.getmembers(other_mod, inspect.isclass):
-            if (obj is not class_type) and (
-                class_type in inspect.getmro(obj)
-            ):
-                subclasses.append((obj, name))
-    return subclasses
-
 # 
 # helper methods pulled out for readability/portability
 # 
 
-def _get_full_member_name(member: ClassOrFunction) -> str:
+@contextlib.contextmanager
+def _gc_paused(min_threshold: int = 50000) -> Iterator[None]:
+    """Pause cyclic gc while bulk walking modules and objects."""
+    was_enabled = gc.isenabled()
+    thresholds = gc.get_threshold()
+    gc.disable()
+    gc.set_threshold(max(thresholds[0], min_threshold), *thresholds[1:])
+    try:
+        yield
+    finally:
+        gc.set_threshold(*thresholds)
+        if was_enabled:
+            gc.enable()
+
+
+def _can_retype(old_class: Type, new_class: Type) -> Optional[bool]:
+    """
+    Check once if instances of old_class can be retyped to new_class.
+
+    Returns None if that can't be tested safely with a bare probe instance.
+    """
+    for class_ in (old_class, new_class):
+        # The probe must not run user code when it is retyped or collected.
+        if getattr(class_, "__del__", None) is not None:
+            return None
+        if class_.__setattr__ is not object.__setattr__:
+            return None
+        # A __class__ descriptor would run its setter on the bare probe.
+        if any("__class__" in vars(base) for base in class_.__mro__ if base is not object):
+            return None
+    try:
+        probe = object.__new__(old_class)
+    except Exception:
+        return None
+    try:
+        probe.__class__ = new_class
+    except Exception:
+        return False
+    return True
+
+
+def _get_full_member_name(member: ClassOrFunction, module_name: Optional[str] = None) -> str:
     """Get the full name for a function or class in a module"""
-    return member.__module__ + "." + member.__name__
+    if module_name is None:
+        module_name = member.__module__
+    return module_name + "." + member.__name__
 
 
 def _get_mro(class_: Type) -> Tuple[Type, ...]:
@@ -47,79 +77,128 @@ def _get_subclasses(class_: Type) -> List[Type]:
     return type.__subclasses__(class_)
 
 
-def _iter_external_members(mod: ModuleType) -> Iterator[Tuple[str, ClassOrFunction]]:
+def _iter_external_members(mod: ModuleType) -> Iterator[Tuple[str, ClassOrFunction, str]]:
     """Get an iterator over a module's external functions and classes."""
-    for member_name, member in _iter_members(mod):
-        if member.__module__ != mod.__name__:
-            yield (member_name, member)
+    mod_name = mod.__name__
+    for member_name, member, member_module in _iter_members(mod):
+        if member_module != mod_name:
+            yield (member_name, member, member_module)
 
 
-def _iter_internal_members(mod: ModuleType) -> Iterator[Tuple[str, ClassOrFunction]]:
+def _iter_internal_members(mod: ModuleType) -> Iterator[Tuple[str, ClassOrFunction, str]]:
     """Get an iterator over a module's internal functions and classes."""
-    for member_name, member in _iter_members(mod):
-        if member.__module__ == mod.__name__:
-            yield (member_name, member)
+    mod_name = mod.__name__
+    for member_name, member, member_module in _iter_members(mod):
+        if member_module == mod_name:
+            yield (member_name, member, member_module)
 
 
 def _iter_modules() -> Iterator[ModuleType]:
     """Iterate over valid modules in sys.modules."""
-    for mod in sys.modules.values():
+    # Snapshot so imports triggered while iterating can't resize the dict.
+    for mod in list(sys.modules.values()):
         if mod:
             yield mod
 
 
-def _iter_members(mod: ModuleType) -> Iterator[Tuple[str, ClassOrFunction]]:
-    """Get an iterator over a module's functions and classes."""
-    for member_name, member in mod.__dict__.items():
-        if inspect.isclass(member) or inspect.isfunction(member):
-            if member.__module__ is not None:
-                yield (member_name, member)
+def _iter_members(
+    mod: ModuleType, _member_types: Tuple[Type, ...] = (type, FunctionType)
+) -> Iterator[Tuple[str, ClassOrFunction, str]]:
+    """Get an iterator over a module's functions and classes, with their module name."""
+    mod_dict = getattr(mod, "__dict__", None)
+    if mod_dict is None:
+        return
+    for member_name, member in list(mod_dict.items()):
+        if isinstance(member, _member_types):
+            member_module = getattr(member, "__module__", None)
+            if member_module is not None:
+                yield (member_name, member, member_module)
 
 
 class _ModuleUpdator(object):
     _old_members_set = set()  # stashed old member set for quick 'in' checks
-    _old_members_map = {}  # stashed old members for updating later
+    _old_member_names = {}  # id of old member to its full name, valid while stashed
+    _reloaded_member_ids = set()  # ids of old members defined in the reloaded mods
+    _old_internal_classes = {}  # stashed old classes per module for updating later
     _reference_cache = {}  # stashed member name to list of objs referring to it
     _instance_cache = {}  # cache of objects to their instances to update
 
     @classmethod
-    def _build_external_reference_cache(cls) -> None:
+    def _build_external_reference_cache(cls, mods: List[ModuleType]) -> None:
         """Build cache of member name to list of objs referring to it."""
-        cls._reference_cache.clear()
+        # Bind to locals; this loop covers every module in sys.modules.
+        reference_cache = cls._reference_cache
+        reference_cache.clear()
+        iter_external_members = _iter_external_members
+        old_member_names = cls._old_member_names
+        # Only members that come from a reloaded module can be stale, so
+        # bucket on the source module name before the identity check.
+        mod_names = {mod.__name__ for mod in mods}
+        # Compare by id so members with odd __eq__/__hash__ can't interfere.
+        reloaded_member_ids = cls._reloaded_member_ids
         for mod in _iter_modules():
-            for member_name, member in _iter_external_members(mod):
-                if member not in cls._old_members_set:
+            # Most modules never import from the reloaded ones. An identity
+            # probe of the dict values is much cheaper than the member scan.
+            mod_dict = getattr(mod, "__dict__", None)
+            if not mod_dict or reloaded_member_ids.isdisjoint(map(id, list(mod_dict.values()))):
+                continue
+            for member_name, member, member_module in iter_external_members(mod):
+                if member_module not in mod_names:
                     continue
-                key = _get_full_member_name(member)
-                cls._reference_cache.setdefault(key, []).append(
-                    (mod, member_name, member)
-                )
+                key = old_member_names.get(id(member))
+                if key is None:
+                    continue
+                refs = reference_cache.get(key)
+                if refs is None:
+                    reference_cache[key] = refs = []
+                refs.append((mod, member_name, member))
 
     @classmethod
     def _build_instance_cache(cls) -> None:
         """Build cache of objects to their instances to update."""
         cls._instance_cache.clear()
-        for obj in gc.get_objects():
-            if type(obj) in cls._old_members_set:
-                cls._instance_cache.setdefault(type(obj), []).append(obj)
+        old_classes = [m for m in cls._old_members_set if isinstance(m, type)]
+        if not old_classes:
+            return
+        # Instances refer to their class, so only referrers need checking.
+        # A single call walks the gc heap once for all of the classes.
+        old_classes_set = set(old_classes)
+        for ref in gc.get_referrers(*old_classes):
+            ref_type = type(ref)
+            if ref_type in old_classes_set:
+                cls._instance_cache.setdefault(ref_type, []).append(ref)
 
     @classmethod
     def _build_old_member_cache(cls, mods: List[ModuleType]) -> None:
         """Build caches to look up old members after reload/update."""
         cls._old_members_set.clear()
-        cls._old_members_map.clear()
+        cls._old_member_names.clear()
+        cls._reloaded_member_ids.clear()
+        cls._old_internal_classes.clear()
+        mod_names = {mod.__name__ for mod in mods}
         for mod in mods:
-            for _, member in _iter_members(mod):
+            internal_classes = []
+            for _, member, member_module in _iter_members(mod):
                 cls._old_members_set.add(member)
-            cls._old_members_map[mod.__name__] = mod.__dict__.copy()
+                # Name each old member once, however many modules refer to it.
+                cls._old_member_names[id(member)] = _get_full_member_name(member, member_module)
+                # Shared imports (stdlib etc) can't be stale; only these can.
+                if member_module in mod_names:
+                    cls._reloaded_member_ids.add(id(member))
+                if member_module == mod.__name__ and isinstance(member, type):
+                    internal_classes.append(member)
+            cls._old_internal_classes[mod.__name__] = internal_classes
 
     @classmethod
     def build_caches(cls, mods: List[ModuleType]):
         """Builds all internally used caches."""
-        cls._build_old_member_cache(mods)
-        # The following rely on the old_member cache, so they must go after.
-        cls._build_external_reference_cache()
-        cls._build_instance_cache()
+        # Everything cached here is reachable, so collections mid-build
+        # are pure overhead.
+        with _gc_paused():
+            cls._build_old_member_cache(mods)
+            # The following rely on the old_member cache, so they must go after.
+            cls._build_external_reference_cache(mods)
+            cls._build_instance_cache()
 
     @classmethod
     def superreload(cls, mods: List[ModuleType]) -> None:
@@ -127,20 +206,22 @@ class _ModuleUpdator(object):
         Reloads mods and then updates any modules in sys.modules that holds copies of its members
         
         This includes anything that subclasses member classes, and any instances of the classes.
+        Progress is logged on the "superreload" logger at INFO.
         """
         cls.build_caches(mods)
 
         max_fails = 10
         fail_counter = {}
-        to_reload = mods[:]
+        to_reload = deque(mods)
         errors = {}
         reloaded_mods = []
+        log_lines = []
         while to_reload:
-            mod = to_reload.pop(0)
+            mod = to_reload.popleft()
             # Try to reload, but allow a number of failures. This helps
             # account for new funcitons/classes and avoid trying to trace
             # import dependencies. Last reload allows errors to bubble up.
-            print("Reloading {}".format(mod.__name__))
+            log_lines.append("Reloading {}".format(mod.__name__))
             fails = fail_counter.get(mod, 0)
             if fails < max_fails:
                 try:
@@ -149,17 +230,20 @@ class _ModuleUpdator(object):
                 except:
                     cur_fails = fails + 1
                     if cur_fails == max_fails:
-                        print("\tFailed. No more retries. Skipping.")
+                        log_lines.append("\tFailed. No more retries. Skipping.")
                         errors[mod] = traceback.format_exc()
 
                     else:
                         txt = (
                             "Failed. Adding to the end of the list. n retries: "
                         )
-                        print("\t" + txt + str(max_fails - cur_fails))
+                        log_lines.append("\t" + txt + str(max_fails - cur_fails))
                         fail_counter[mod] = cur_fails
                         to_reload.append(mod)
 
+        if log_lines:
+            logger.info("\n".join(log_lines))
+
         cls.update_stale_modules_and_instances(reloaded_mods)
 
         # Report errors.
@@ -170,23 +254,23 @@ class _ModuleUpdator(object):
     @classmethod
     def superwrapper(cls, mods: List[ModuleType], wrapper_fxn: Callable):
         """Wrapps all functions and methods in modules in wrapper function."""
-        cls.build_caches(mods)
-
-        for mod in mods:
-            updates = {}
-            internal_members = list(_iter_internal_members(mod))
-            for member_name, member in internal_members:
-                wrapped = None
-                if inspect.isfunction(member):
-                    full_name = member.__module__ + "." + member.__name__
-                    wrapped = wrapper_fxn(member, full_name)
-                    updates[member_name] = wrapped
-                if inspect.isclass(member):
-                    wrapped = cls.wrap_class(member, wrapper_fxn)
-                    updates[member_name] = wrapped
-            mod.__dict__.update(updates)
-
-        cls.update_stale_modules_and_instances(mods)
+        with _gc_paused():
+            cls.build_caches(mods)
+
+            for mod in mods:
+                updates = {}
+                for member_name, member, _ in _iter_internal_members(mod):
+                    wrapped = None
+                    if isinstance(member, FunctionType):
+                        full_name = _get_full_member_name(member, mod.__name__)
+                        wrapped = wrapper_fxn(member, full_name)
+                        updates[member_name] = wrapped
+                    if isinstance(member, type):
+                        wrapped = cls.wrap_class(member, wrapper_fxn)
+                        updates[member_name] = wrapped
+                mod.__dict__.update(updates)
+
+            cls.update_stale_modules_and_instances(mods)
 
     @classmethod
     def update_instances(cls, old_class: Type, new_class: Type) -> None:
@@ -195,7 +279,19 @@ class _ModuleUpdator(object):
         
         Some types (like metaclasses) do not support dynamic retyping.
         """
-        for ref in cls._instance_cache.get(old_class, []):
+        refs = cls._instance_cache.get(old_class)
+        if not refs:
+            return
+        can_retype = _can_retype(old_class, new_class)
+        if can_retype is False:
+            logger.debug("Could not update instances of %s.", old_class)
+            return
+        if can_retype:
+            for ref in refs:
+                ref.__class__ = new_class
+            return
+        # Couldn't probe the classes, so fall back to checking each instance.
+        for ref in refs:
             try:
                 ref.__class__ = new_class
             # Failure to update an instance to a new class is
@@ -207,11 +303,17 @@ class _ModuleUpdator(object):
     @classmethod
     def update_other_modules_refs(cls, mod: ModuleType) -> None:
         """Updates any modules in sys.modules that holds copies of mod's members"""
-        for _, new_member in _iter_internal_members(mod):
-            key = _get_full_member_name(new_member)
-            old_refs = cls._reference_cache.get(key, [])
+        reference_cache = cls._reference_cache
+        get_full_member_name = _get_full_member_name
+        # Group the new members per referring module to update each dict once.
+        pending_updates = {}
+        for _, new_member, member_module in _iter_internal_members(mod):
+            key = get_full_member_name(new_member, member_module)
+            old_refs = reference_cache.get(key, ())
             for (other_mod, other_member_name, _) in old_refs:
-                other_mod.__dict__.update({other_member_name: new_member})
+                pending_updates.setdefault(other_mod, {})[other_member_name] = new_member
+        for other_mod, updates in pending_updates.items():
+            other_mod.__dict__.update(updates)
 
     @classmethod
     def update_stale_modules_and_instances(cls, mods: List[ModuleType]) -> None:
@@ -221,16 +323,15 @@ class _ModuleUpdator(object):
         Updates any old references to classes and functions. Updates any
         subclasses and instances of the new object.
         """
+        old_internal_classes = cls._old_internal_classes
+        update_subclasses = cls.update_subclasses
+        update_instances = cls.update_instances
         for mod in mods:
             cls.update_other_modules_refs(mod)
 
-            old_internal_classes = [
-                obj
-                for obj in cls._old_members_map[mod.__name__].values()
-                if inspect.isclass(obj) and obj.__module__ == mod.__name__
-            ]
-            for old_class in old_internal_classes:
-                new_class = mod.__dict__.get(old_class.__name__)
+            mod_dict = mod.__dict__
+            for old_class in old_internal_classes[mod.__name__]:
+                new_class = mod_dict.get(old_class.__name__)
                 # If a class has been removed, we won't find it in the new mod
                 # dict. Skip it for now, but probably a good idea to log it.
                 if not new_class:
@@ -240,28 +341,40 @@ class _ModuleUpdator(object):
                         new_class,
                     )
                     continue
-                cls.update_subclasses(old_class, new_class)
-                cls.update_instances(old_class, new_class)
+                update_subclasses(old_class, new_class)
+                update_instances(old_class, new_class)
 
     @classmethod
     def update_subclasses(cls, old_class: Type, new_class: Type):
         """Find subclasses of old_class and update them to new_class."""
-        for subclass in _get_subclasses(old_class):
-            new_bases = []
-            for base in subclass.__bases__:
-                # If the module and class name matches, use the new class.
-                if base.__module__ == new_class.__module__:
-                    if base.__name__ == new_class.__name__:
-                        new_bases.append(new_class)
-                        continue
-                new_bases.append(base)
-            subclass.__bases__ = tuple(new_bases)
+        subclasses = _get_subclasses(old_class)
+        if not subclasses:
+            return
+        for subclass in subclasses:
+            bases = subclass.__bases__
+            # Direct subclasses list old_class itself as a base, so an identity
+            # check is enough. Assigning __bases__ recomputes the mro, so
+            # avoid it if nothing would change.
+            if old_class not in bases:
+                continue
+            subclass.__bases__ = tuple(
+                new_class if base is old_class else base for base in bases
+            )
 
     @classmethod
-    def wrap_class(cls, class_: Type, fxn_wrapper: Callable, member_names: Optional[str] = None) -> Type:
+    def wrap_class(
+        cls,
+        class_: Type,
+        fxn_wrapper: Callable,
+        member_names: Optional[Union[str, Iterable[str]]] = None,
+    ) -> Type:
         """Wrap a class's member functions in the wrapped method and returns the class."""
+        # A single name used to be matched as a substring, so treat it as one name.
+        if isinstance(member_names, str):
+            member_names = (member_names,)
+        member_names_set = set(member_names) if member_names else None
         for name, member in class_.__dict__.items():
-            if member_names and name not in member_names:
+            if member_names_set is not None and name not in member_names_set:
                 continue
             full_name = class_.__module__ + "." + class_.__name__ + "." + name
             if isinstance(member, (FunctionType, BuiltinFunctionType)):
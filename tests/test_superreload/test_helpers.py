@@ -0,0 +1,203 @@
+import gc
+import sys
+import types
+import unittest
+from collections import OrderedDict
+from functools import wraps
+from unittest import mock
+import superreload
+
+
+class Test(unittest.TestCase):
+    def test_gc_paused_restores_state(self):
+        thresholds = gc.get_threshold()
+        was_enabled = gc.isenabled()
+        with superreload._gc_paused():
+            self.assertFalse(gc.isenabled())
+        self.assertEqual(gc.get_threshold(), thresholds)
+        self.assertEqual(gc.isenabled(), was_enabled)
+
+    def test_can_retype(self):
+        class Plain(object):
+            pass
+
+        class OtherPlain(object):
+            pass
+
+        class Slotted(object):
+            __slots__ = ("a",)
+
+        class WithDel(object):
+            def __del__(self):
+                pass
+
+        self.assertTrue(superreload._can_retype(Plain, OtherPlain))
+        self.assertFalse(superreload._can_retype(Plain, Slotted))
+        self.assertIsNone(superreload._can_retype(Plain, WithDel))
+
+    def test_wrap_class_member_names(self):
+        class Wrapped(object):
+            def func(self):
+                return "func"
+
+            def f(self):
+                return "f"
+
+        def wrapper(inner_fxn, full_member_name):
+            return lambda *args: "wrapped " + inner_fxn(*args)
+
+        superreload._ModuleUpdator.wrap_class(Wrapped, wrapper, "func")
+        self.assertEqual(Wrapped().func(), "wrapped func")
+        self.assertEqual(Wrapped().f(), "f")
+
+    def test_can_retype_class_descriptor(self):
+        class Plain(object):
+            pass
+
+        class WithClassDescriptor(object):
+            @property
+            def __class__(self):
+                return type(self)
+
+        class InheritsClassDescriptor(WithClassDescriptor):
+            pass
+
+        self.assertIsNone(superreload._can_retype(WithClassDescriptor, Plain))
+        self.assertIsNone(superreload._can_retype(Plain, InheritsClassDescriptor))
+
+
+class TestUpdateInstances(unittest.TestCase):
+    def tearDown(self):
+        superreload._ModuleUpdator._instance_cache.clear()
+
+    def _update(self, old_class, new_class, instances):
+        superreload._ModuleUpdator._instance_cache[old_class] = instances
+        superreload._ModuleUpdator.update_instances(old_class, new_class)
+
+    def test_fast_path(self):
+        class Old(object):
+            def v(self):
+                return 1
+
+        class New(object):
+            def v(self):
+                return 2
+
+        instances = [Old(), Old()]
+        self._update(Old, New, instances)
+        self.assertEqual([inst.v() for inst in instances], [2, 2])
+
+    def test_incompatible_layout_skipped(self):
+        class Old(object):
+            def v(self):
+                return 1
+
+        class New(object):
+            __slots__ = ()
+
+            def v(self):
+                return 2
+
+        instances = [Old()]
+        self._update(Old, New, instances)
+        self.assertEqual(instances[0].v(), 1)
+
+    def test_class_descriptor_fallback(self):
+        class Old(object):
+            def __init__(self):
+                self.log = []
+
+            @property
+            def __class__(self):
+                return type(self)
+
+            @__class__.setter
+            def __class__(self, value):
+                self.log.append(value)
+                object.__dict__["__class__"].__set__(self, value)
+
+            def v(self):
+                return 1
+
+        class New(Old):
+            def v(self):
+                return 2
+
+        instances = [Old()]
+        self._update(Old, New, instances)
+        self.assertEqual(instances[0].v(), 2)
+        self.assertEqual(instances[0].log, [New])
+
+
+class TestReferenceCache(unittest.TestCase):
+    def tearDown(self):
+        superreload._ModuleUpdator.build_caches([])
+
+    def test_shared_imports_skip_unrelated_modules(self):
+        reloaded = types.ModuleType("reloaded_mod")
+
+        def func():
+            pass
+
+        func.__module__ = reloaded.__name__
+        reloaded.func = func
+        reloaded.OrderedDict = OrderedDict
+        reloaded.wraps = wraps
+
+        importer = types.ModuleType("importer_mod")
+        importer.func = func
+        unrelated = types.ModuleType("unrelated_mod")
+        unrelated.OrderedDict = OrderedDict
+        unrelated.wraps = wraps
+
+        updator = superreload._ModuleUpdator
+        updator._build_old_member_cache([reloaded])
+        with mock.patch.object(
+            superreload, "_iter_external_members", wraps=superreload._iter_external_members
+        ) as iter_external_members:
+            with mock.patch.dict(
+                sys.modules, {importer.__name__: importer, unrelated.__name__: unrelated}
+            ):
+                updator._build_external_reference_cache([reloaded])
+        self.assertEqual(iter_external_members.call_args_list, [mock.call(importer)])
+        self.assertEqual(
+            updator._reference_cache, {"reloaded_mod.func": [(importer, "func", func)]}
+        )
+
+
+class TestUpdateSubclasses(unittest.TestCase):
+    def _make_base(self):
+        class Base(object):
+            pass
+
+        Base.__module__ = "reloaded_mod"
+        return Base
+
+    def test_same_named_base_survives(self):
+        old_base = self._make_base()
+        impostor = self._make_base()
+        new_base = self._make_base()
+
+        class Sub(old_base, impostor):
+            pass
+
+        superreload._ModuleUpdator.update_subclasses(old_base, new_base)
+        self.assertEqual(Sub.__bases__, (new_base, impostor))
+
+    def test_multiple_bases(self):
+        old_base = self._make_base()
+        new_base = self._make_base()
+
+        class Mixin(object):
+            pass
+
+        class Other(object):
+            pass
+
+        class Sub(Mixin, old_base, Other):
+            pass
+
+        superreload._ModuleUpdator.update_subclasses(old_base, new_base)
+        self.assertEqual(Sub.__bases__, (Mixin, new_base, Other))
+        self.assertTrue(issubclass(Sub, new_base))
+        self.assertFalse(issubclass(Sub, old_base))
@@ -0,0 +1,43 @@
+import importlib
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import superreload
+from .. import modB
+
+
+class Test(unittest.TestCase):
+    def test_reload_logs_progress(self):
+        with self.assertLogs("superreload", "INFO") as logs:
+            superreload.reload_module(modB)
+        self.assertEqual(logs.output, ["INFO:superreload:Reloading tests.modB"])
+
+    def test_failed_reload_logs_retries(self):
+        temp_dir = tempfile.mkdtemp()
+        mod_path = os.path.join(temp_dir, "superreload_failing_mod.py")
+        with open(mod_path, "w") as f:
+            f.write("value = 1\n")
+        sys.path.insert(0, temp_dir)
+        try:
+            mod = importlib.import_module("superreload_failing_mod")
+            with open(mod_path, "w") as f:
+                f.write("raise RuntimeError('broken module')\n")
+            with self.assertLogs("superreload", "INFO") as logs:
+                superreload.reload_module(mod)
+        finally:
+            sys.path.remove(temp_dir)
+            sys.modules.pop("superreload_failing_mod", None)
+            shutil.rmtree(temp_dir)
+
+        info = [r.getMessage() for r in logs.records if r.levelname == "INFO"]
+        self.assertEqual(len(info), 1)
+        lines = info[0].split("\n")
+        self.assertEqual(lines[0], "Reloading superreload_failing_mod")
+        self.assertIn("\tFailed. Adding to the end of the list. n retries: 9", lines)
+        self.assertEqual(lines[-1], "\tFailed. No more retries. Skipping.")
+        self.assertEqual(lines.count("Reloading superreload_failing_mod"), 10)
+        errors = [r.getMessage() for r in logs.records if r.levelname == "ERROR"]
+        self.assertEqual(errors[0], "Failed to reload superreload_failing_mod")
+        self.assertIn("broken module", errors[1])